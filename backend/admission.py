@@ -0,0 +1,162 @@
+"""
+Admission control so anonymous telemetry cannot starve admin requests.
+
+Each route class gets its own lane with a concurrency limit and a bounded
+wait queue. Because the lanes don't share slots, admin routes always keep
+their own capacity. When a lane is saturated, a request waits up to
+`max_wait` seconds and is rejected right away once the queue is full. Keep
+the telemetry limit well below the database pool size and the threadpool
+size (40 by default) so admin handlers still have connections and threads.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+from starlette.responses import JSONResponse
+
+
+def _env_number(name: str, default, cast=int):
+    value = os.getenv(name)
+    return cast(value) if value else default
+
+
+class Lane:
+    def __init__(self, name: str, limit: int, queue_limit: int, max_wait: float, retry_after: int = 1):
+        self.name = name
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters: deque = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    async def acquire(self) -> str | None:
+        """Take a slot. Return None when admitted, else the rejection reason."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._record_admit(0.0)
+            return None
+        if len(self._waiters) >= self.queue_limit:
+            self.rejected_queue_full += 1
+            return "queue_full"
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=self.max_wait)
+        except BaseException:
+            # Cancelled while queued: give back a slot that was already handed over.
+            if waiter.done():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+                waiter.cancel()
+            raise
+        if not waiter.done():
+            self._waiters.remove(waiter)
+            waiter.cancel()
+            self.rejected_timeout += 1
+            return "timeout"
+        self._record_admit(time.perf_counter() - started)
+        return None
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter so it can't be stolen.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def _record_admit(self, waited: float):
+        self.admitted += 1
+        self.queue_time_total += waited
+        self.queue_time_max = max(self.queue_time_max, waited)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue_limit": self.queue_limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "queue_time_avg_ms": round(1000 * self.queue_time_total / self.admitted, 3) if self.admitted else 0.0,
+            "queue_time_max_ms": round(1000 * self.queue_time_max, 3),
+        }
+
+
+class AdmissionController:
+    """Map request paths to lanes by prefix; unmatched paths bypass admission."""
+
+    def __init__(self, lanes: dict[str, Lane], routes: list[tuple[str, str]]):
+        self.lanes = lanes
+        self.routes = routes
+
+    @classmethod
+    def from_env(cls):
+        lanes = {
+            "telemetry": Lane(
+                "telemetry",
+                limit=_env_number("TELEMETRY_CONCURRENCY", 4),
+                queue_limit=_env_number("TELEMETRY_QUEUE", 16),
+                max_wait=_env_number("TELEMETRY_MAX_WAIT", 0.25, float),
+            ),
+            "admin": Lane(
+                "admin",
+                limit=_env_number("ADMIN_CONCURRENCY", 16),
+                queue_limit=_env_number("ADMIN_QUEUE", 64),
+                max_wait=_env_number("ADMIN_MAX_WAIT", 5.0, float),
+            ),
+        }
+        routes = [("/analytics/", "telemetry"), ("/jobs", "admin"), ("/admin/", "admin")]
+        return cls(lanes, routes)
+
+    def lane_for(self, path: str) -> Lane | None:
+        for prefix, lane_name in self.routes:
+            if path.startswith(prefix):
+                return self.lanes[lane_name]
+        return None
+
+    def stats(self) -> dict:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that holds a lane slot for the whole request."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        lane = self.controller.lane_for(scope["path"]) if scope["type"] == "http" else None
+        if lane is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        rejection = await lane.acquire()
+        if rejection is not None:
+            # A full queue means the caller should back off (429); timing out
+            # in the queue means the server is busy (503).
+            status = 429 if rejection == "queue_full" else 503
+            response = JSONResponse(
+                {"detail": f"{lane.name} capacity exhausted"},
+                status_code=status,
+                headers={"Retry-After": str(lane.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release()
@@ -0,0 +1,138 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+# 1970-01-01 was a Thursday; shift so week buckets start on Monday.
+_MONDAY_OFFSET = 4 * SECONDS_PER_DAY
+_EPOCH = date(1970, 1, 1)
+_EPOCH_DT = datetime(1970, 1, 1)
+_NO_TIME = np.iinfo(np.int64).max
+# Install ids are canonical UUID strings, so fixed-width bytes hold them.
+INSTALL_ID_DTYPE = "S36"
+FETCH_CHUNK_ROWS = 65_536
+
+
+class epoch_seconds(FunctionElement):
+    """Whole epoch seconds of a naive UTC timestamp, computed by the database."""
+
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(epoch_seconds, "sqlite")
+def _epoch_seconds_sqlite(element, compiler, **kw):
+    return f"CAST(strftime('%s', {compiler.process(element.clauses, **kw)}) AS INTEGER)"
+
+
+@compiles(epoch_seconds, "postgresql")
+def _epoch_seconds_postgresql(element, compiler, **kw):
+    return f"CAST(EXTRACT(EPOCH FROM {compiler.process(element.clauses, **kw)}) AS BIGINT)"
+
+
+def fetch_columns(connection, stmt, dtype, chunk_size: int | None = None) -> np.ndarray:
+    """
+    Run `stmt` and load its rows into a structured array.
+
+    Rows are read off the DBAPI cursor `chunk_size` at a time and copied into
+    a preallocated array that doubles when full, so at most one chunk of row
+    tuples is alive at once and no SQLAlchemy `Row` objects are built.
+    """
+    chunk_size = chunk_size or FETCH_CHUNK_ROWS
+    result = connection.execute(stmt)
+    try:
+        columns = np.empty(chunk_size, dtype=dtype)
+        size = 0
+        while rows := result.cursor.fetchmany(chunk_size):
+            if size + len(rows) > len(columns):
+                columns = np.concatenate([columns, np.empty(len(columns), dtype=dtype)])
+            columns[size:size + len(rows)] = rows
+            size += len(rows)
+        return columns[:size]
+    finally:
+        result.close()
+
+
+def week_index(seconds: np.ndarray) -> np.ndarray:
+    return (seconds - _MONDAY_OFFSET) // SECONDS_PER_WEEK
+
+
+def week_start(index: int) -> date:
+    return _EPOCH + timedelta(seconds=int(index) * SECONDS_PER_WEEK + _MONDAY_OFFSET)
+
+
+def retention_matrix(
+    install_ids: np.ndarray,
+    first_seen: np.ndarray,
+    launch_ts: np.ndarray,
+    weeks: int,
+    now: datetime,
+):
+    """
+    Bucket launches into a cohort x week-offset matrix.
+
+    Each input row is one launch event joined to its install's `first_seen`,
+    with both timestamps in epoch seconds. Returns
+    `(cohort_starts, sizes, retained)` where `retained[c][w]` is the number
+    of distinct installs from cohort `c` that launched in week `w` after
+    their first week, or None when that week has not happened yet.
+    """
+    if len(install_ids) == 0:
+        return [], [], []
+
+    _, install_idx = np.unique(install_ids, return_inverse=True)
+    cohort_week = week_index(first_seen)
+    offset = week_index(launch_ts) - cohort_week
+
+    install_cohort = np.empty(install_idx.max() + 1, dtype=np.int64)
+    install_cohort[install_idx] = cohort_week
+    cohorts, cohort_idx = np.unique(install_cohort, return_inverse=True)
+    sizes = np.bincount(cohort_idx, minlength=len(cohorts))
+
+    # Collapse repeat launches to one (install, week) pair before counting.
+    valid = (offset >= 0) & (offset < weeks)
+    pairs = np.unique(install_idx[valid] * weeks + offset[valid])
+    matrix = np.zeros((len(cohorts), weeks), dtype=np.int64)
+    np.add.at(matrix, (cohort_idx[pairs // weeks], pairs % weeks), 1)
+
+    current_week = int(week_index((now - _EPOCH_DT) // timedelta(seconds=1)))
+    retained = []
+    for row, cohort in zip(matrix.tolist(), cohorts.tolist()):
+        elapsed = current_week - cohort
+        retained.append([count if w <= elapsed else None for w, count in enumerate(row)])
+
+    return [week_start(c) for c in cohorts.tolist()], sizes.tolist(), retained
+
+
+def funnel_counts(
+    install_ids: np.ndarray,
+    steps: np.ndarray,
+    seconds: np.ndarray,
+    step_count: int,
+) -> list[int]:
+    """
+    Count installs reaching each ordered funnel step.
+
+    `steps[i]` is the funnel position of event `i` and `seconds[i]` its epoch
+    time. An install reaches step `k` when it has a step-`k` event at or
+    after the time it reached `k - 1`.
+    """
+    if len(install_ids) == 0:
+        return [0] * step_count
+
+    _, install_idx = np.unique(install_ids, return_inverse=True)
+    install_count = install_idx.max() + 1
+
+    reached_at = np.full(install_count, np.iinfo(np.int64).min, dtype=np.int64)
+    counts = []
+    for step in range(step_count):
+        mask = (steps == step) & (seconds >= reached_at[install_idx])
+        next_reached = np.full(install_count, _NO_TIME, dtype=np.int64)
+        np.minimum.at(next_reached, install_idx[mask], seconds[mask])
+        reached_at = next_reached
+        counts.append(int(np.count_nonzero(reached_at != _NO_TIME)))
+    return counts
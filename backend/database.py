@@ -1,27 +1,218 @@
+import hashlib
+import hmac
+import itertools
 import os
-from sqlalchemy import create_engine
+import secrets
+import time
+import warnings
+from threading import Event, Lock, Thread
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # Load from environment, or fall back to local SQLite for dev
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./jobs.db")
 
-# Use different connect_args depending on the database type
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+# Optional comma-separated replica URLs for read-only handlers
+DATABASE_READ_URLS = [
+    url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()
+]
+DATABASE_READ_PIN_SECONDS = float(os.getenv("DATABASE_READ_PIN_SECONDS", "5"))
+DATABASE_READ_CONNECT_TIMEOUT = int(os.getenv("DATABASE_READ_CONNECT_TIMEOUT", "2"))
+
+
+def make_engine(url: str, connect_timeout: int | None = None):
+    # Use different connect_args depending on the database type
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    if connect_timeout is not None:
+        return create_engine(url, connect_args={"connect_timeout": connect_timeout})
+    return create_engine(url)
+
+
+engine = make_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
 
+class ReplicaRouter:
+    """
+    Pick an engine for read-only work.
+
+    Replicas are used round-robin. Their health is probed with `SELECT 1`
+    every `health_interval` seconds by a background thread, so requests only
+    read the cached result; a replica is skipped until its first probe passes.
+    Clients that wrote recently stay on the primary for `pin_seconds` so they
+    read their own writes. The pin is kept in this process and also handed to
+    the client as a signed token (see `pin_token`), which other workers accept
+    when they share the signing secret (`READ_PIN_SECRET`, else `API_KEY`).
+    With no healthy replica, reads go to the primary.
+    """
+
+    def __init__(
+        self,
+        primary,
+        replicas=(),
+        pin_seconds=5.0,
+        health_interval=10.0,
+        clock=time.time,
+        secret: str | None = None,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.pin_seconds = pin_seconds
+        self.health_interval = health_interval
+        self._clock = clock
+        self._secret = secret.encode() if secret else None
+        self._cycle = itertools.cycle(range(len(self.replicas)))
+        self._health: dict[int, bool] = {}
+        self._pinned: dict[str, float] = {}
+        self._lock = Lock()
+        self._stopped = Event()
+
+    def record_write(self, client_key: str | None) -> str | None:
+        """Pin the client to the primary and return a token carrying the pin."""
+        if not client_key or not self.replicas:
+            return None
+        now = self._clock()
+        until = now + self.pin_seconds
+        with self._lock:
+            self._pinned[client_key] = until
+            # Drop expired pins so anonymous writers don't grow the map forever.
+            if len(self._pinned) > 1024:
+                self._pinned = {k: v for k, v in self._pinned.items() if v > now}
+        return self.pin_token(client_key, until)
+
+    def pin_token(self, client_key: str, until: float) -> str:
+        expires = str(int(until) + 1)
+        return f"{expires}.{self._sign(client_key, expires)}"
+
+    def _signing_key(self) -> bytes:
+        # Resolved on first use, after main has loaded backend/.env.
+        if self._secret is None:
+            secret = os.getenv("READ_PIN_SECRET") or os.getenv("API_KEY")
+            if not secret:
+                warnings.warn(
+                    "Read replicas are configured without READ_PIN_SECRET or API_KEY; "
+                    "read pins will only hold within each worker.",
+                    RuntimeWarning,
+                )
+                secret = secrets.token_hex(16)
+            self._secret = secret.encode()
+        return self._secret
+
+    def _sign(self, client_key: str, expires: str) -> str:
+        message = f"{client_key}|{expires}".encode()
+        return hmac.new(self._signing_key(), message, hashlib.sha256).hexdigest()
+
+    def is_pinned(self, client_key: str | None, token: str | None = None) -> bool:
+        if not client_key:
+            return False
+        now = self._clock()
+        if token:
+            expires, _, signature = token.partition(".")
+            if (
+                expires.isdigit()
+                and int(expires) > now
+                and hmac.compare_digest(signature, self._sign(client_key, expires))
+            ):
+                return True
+        with self._lock:
+            until = self._pinned.get(client_key)
+        return until is not None and until > now
+
+    def check_health(self):
+        """Probe every replica once and cache the results."""
+        for index, replica in enumerate(self.replicas):
+            try:
+                with replica.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+                ok = True
+            except Exception:
+                ok = False
+            with self._lock:
+                self._health[index] = ok
+
+    def start_health_checks(self):
+        Thread(target=self._check_forever, name="replica-health", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _check_forever(self):
+        while not self._stopped.is_set():
+            self.check_health()
+            self._stopped.wait(self.health_interval)
+
+    def _healthy(self, index: int) -> bool:
+        with self._lock:
+            return self._health.get(index, False)
+
+    def engine_for_read(self, client_key: str | None = None, token: str | None = None):
+        if not self.replicas or self.is_pinned(client_key, token):
+            return self.primary
+        with self._lock:
+            start = next(self._cycle)
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+            if self._healthy(index):
+                return self.replicas[index]
+        return self.primary
+
+    def read_session(self, client_key: str | None = None, token: str | None = None):
+        return SessionLocal(bind=self.engine_for_read(client_key, token))
+
+
+read_router = ReplicaRouter(
+    engine,
+    [make_engine(url, connect_timeout=DATABASE_READ_CONNECT_TIMEOUT) for url in DATABASE_READ_URLS],
+    pin_seconds=DATABASE_READ_PIN_SECONDS,
+)
+if read_router.replicas:
+    read_router.start_health_checks()
+
+
+# Columns added after the tables first shipped: (table, column, statements).
+# Existing rows get the epoch as recorded_at, so they sort before new rows.
+_EPOCH = "'1970-01-01 00:00:00.000000'"
+COLUMN_MIGRATIONS = [
+    ("analytics_events", "recorded_at", [
+        "ALTER TABLE analytics_events ADD COLUMN recorded_at TIMESTAMP",
+        f"UPDATE analytics_events SET recorded_at = {_EPOCH}",
+    ]),
+    ("analytics_installs", "recorded_at", [
+        "ALTER TABLE analytics_installs ADD COLUMN recorded_at TIMESTAMP",
+        f"UPDATE analytics_installs SET recorded_at = {_EPOCH}",
+    ]),
+]
+
+
+def ensure_columns(bind=None):
+    bind = bind if bind is not None else engine
+    with bind.begin() as connection:
+        inspector = inspect(connection)
+        for table, column, statements in COLUMN_MIGRATIONS:
+            if column in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            for stmt in statements:
+                connection.exec_driver_sql(stmt)
+
+
+INDEX_STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_analytics_installs_last_seen ON analytics_installs (last_seen)",
+    "CREATE INDEX IF NOT EXISTS ix_analytics_events_install_id ON analytics_events (install_id)",
+    # Covers the stats and report queries, which filter on event and read
+    # only install_id and ts; it replaces the older single-column index.
+    "CREATE INDEX IF NOT EXISTS ix_analytics_events_event_install_id_ts ON analytics_events (event, install_id, ts)",
+    "DROP INDEX IF EXISTS ix_analytics_events_event",
+    # Snapshot cursors.
+    "CREATE INDEX IF NOT EXISTS ix_analytics_installs_recorded_at ON analytics_installs (recorded_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_analytics_events_recorded_at ON analytics_events (recorded_at, id)",
+]
+
+
 def ensure_indexes():
-    statements = [
-        "CREATE INDEX IF NOT EXISTS ix_analytics_installs_last_seen ON analytics_installs (last_seen)",
-        "CREATE INDEX IF NOT EXISTS ix_analytics_events_install_id ON analytics_events (install_id)",
-        "CREATE INDEX IF NOT EXISTS ix_analytics_events_event ON analytics_events (event)",
-    ]
     with engine.begin() as connection:
-        for stmt in statements:
+        for stmt in INDEX_STATEMENTS:
             connection.exec_driver_sql(stmt)
@@ -0,0 +1,213 @@
+import os
+import select
+import threading
+import time
+from itertools import count
+from typing import Callable, Hashable
+
+from sqlalchemy import event, text
+
+CHANNEL = "joblog_invalidate"
+_NOTIFY = text("SELECT pg_notify(:channel, :topic)")
+
+
+class _Bus:
+    """
+    Publishing shared by every bus.
+
+    With a `session`, the bump is tied to that session's transaction and
+    only takes effect once it commits. `coalesce` drops publishes of a topic
+    that come within that many seconds of the previous one from this worker;
+    caches fed by coalesced topics should set a matching `max_age`.
+    """
+
+    def __init__(self):
+        self._published: dict[str, float] = {}
+        self._publish_lock = threading.Lock()
+
+    def publish(self, topic: str, session=None, coalesce: float = 0.0):
+        if coalesce and not self._due(topic, coalesce):
+            return
+        if session is None:
+            self._send(topic)
+        else:
+            self._send_in(session, topic)
+
+    def _due(self, topic: str, interval: float) -> bool:
+        now = time.monotonic()
+        with self._publish_lock:
+            last = self._published.get(topic)
+            if last is not None and now - last < interval:
+                return False
+            self._published[topic] = now
+            return True
+
+    def _send(self, topic: str):
+        raise NotImplementedError
+
+    def _send_in(self, session, topic: str):
+        event.listen(session, "after_commit", lambda _session: self._send(topic), once=True)
+
+
+class LocalBus(_Bus):
+    """In-process version counters; enough for a single worker."""
+
+    def __init__(self):
+        super().__init__()
+        self._versions: dict[str, int] = {}
+        # Part of every version, so one bump invalidates all topics, including
+        # ones this worker has only read so far.
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def version(self, topic: str) -> Hashable:
+        with self._lock:
+            return self._generation, self._versions.get(topic, 0)
+
+    def _send(self, topic: str):
+        self._bump(topic)
+
+    def _bump(self, topic: str):
+        with self._lock:
+            self._versions[topic] = self._versions.get(topic, 0) + 1
+
+    def _bump_all(self):
+        with self._lock:
+            self._generation += 1
+
+
+class FileBus(_Bus):
+    """
+    Share versions between workers on one host through a directory.
+
+    Each topic is a small file holding an opaque token; publishing replaces it
+    atomically, and readers treat any change of token as a new version.
+    """
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._tokens = count()
+
+    def _path(self, topic: str) -> str:
+        return os.path.join(self.directory, topic)
+
+    def _send(self, topic: str):
+        token = f"{time.time_ns()}-{os.getpid()}-{next(self._tokens)}"
+        tmp_path = f"{self._path(topic)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as handle:
+            handle.write(token)
+        os.replace(tmp_path, self._path(topic))
+
+    def version(self, topic: str) -> Hashable:
+        try:
+            with open(self._path(topic)) as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return ""
+
+
+class PostgresBus(LocalBus):
+    """
+    Fan out version bumps to every worker with PostgreSQL `LISTEN/NOTIFY`.
+
+    Each worker keeps a dedicated listening connection on a daemon thread and
+    bumps its local counter for every notified topic. Notifications sent while
+    that connection was down (or before it first connected) are lost, so every
+    successful `LISTEN` starts a new generation that invalidates all topics.
+    Publishing with a session sends `pg_notify` inside that transaction, so
+    it is delivered on commit without an extra round trip.
+    """
+
+    def __init__(self, engine, poll_timeout: float = 5.0, start: bool = True):
+        super().__init__()
+        self.engine = engine
+        self.poll_timeout = poll_timeout
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._listen_forever, name="invalidation-listener", daemon=True)
+        if start:
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _send(self, topic: str):
+        self._bump(topic)
+        with self.engine.begin() as connection:
+            connection.execute(_NOTIFY, {"channel": CHANNEL, "topic": topic})
+
+    def _send_in(self, session, topic: str):
+        session.execute(_NOTIFY, {"channel": CHANNEL, "topic": topic})
+        event.listen(session, "after_commit", lambda _session: self._bump(topic), once=True)
+
+    def _listen_forever(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception:
+                self._stopped.wait(1)
+
+    def _listen(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        connection = psycopg2.connect(dsn)
+        try:
+            connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self._bump_all()
+            while not self._stopped.is_set():
+                if select.select([connection], [], [], self.poll_timeout) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    self._bump(connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+
+def bus_for(engine):
+    """Pick the invalidation bus matching the configured database."""
+    url = engine.url
+    if url.get_backend_name() == "postgresql":
+        return PostgresBus(engine)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        return FileBus(f"{url.database}.bus")
+    return LocalBus()
+
+
+class VersionedCache:
+    """
+    Memoize computed results until the bus publishes a new topic version.
+
+    `max_age` additionally expires entries after that many seconds, which
+    bounds staleness for topics whose publishes are coalesced.
+    """
+
+    def __init__(self, bus, topic: str, max_age: float | None = None):
+        self.bus = bus
+        self.topic = topic
+        self.max_age = max_age
+        self._entries: dict[Hashable, tuple[Hashable, float, object]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        # Read the version first so a bump during compute forces a refresh.
+        version = self.bus.version(self.topic)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            if self.max_age is None or now - entry[1] < self.max_age:
+                return entry[2]
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, now, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
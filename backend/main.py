@@ -1,17 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case
+from sqlalchemy import func, case, select
 import os
 import re
+from typing import Literal
 from datetime import date, datetime, timedelta
 
-from database import Base, engine, SessionLocal, ensure_indexes
-import models
-import schemas
+# Load backend/.env before the local modules read their settings.
 from dotenv import load_dotenv
 load_dotenv()
 
+from database import Base, engine, SessionLocal, ensure_columns, ensure_indexes, read_router
+import admission
+import analytics
+import invalidation
+import models
+import schemas
+import snapshot
+
 app = FastAPI()
 
 origins = [
@@ -20,6 +27,11 @@ origins = [
 ]
 
 
+# Admission control: separate lanes keep telemetry bursts from starving
+# admin routes. Added before CORS so rejections still carry CORS headers.
+admission_controller = admission.AdmissionController.from_env()
+app.add_middleware(admission.AdmissionMiddleware, controller=admission_controller)
+
 # CORS config
 app.add_middleware(
     CORSMiddleware,
@@ -27,12 +39,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Read-Pin"],
 )
 
 # Create DB tables
 Base.metadata.create_all(bind=engine)
+ensure_columns()
 ensure_indexes()
 
+# Version bumps shared across workers keep per-process caches coherent.
+# Telemetry is high-volume and only feeds the admin stats cache, so its bumps
+# are coalesced and that cache also expires on the same interval.
+ANALYTICS_PUBLISH_INTERVAL = 1.0
+bus = invalidation.bus_for(engine)
+jobs_cache = invalidation.VersionedCache(bus, "jobs")
+stats_cache = invalidation.VersionedCache(bus, "analytics", max_age=ANALYTICS_PUBLISH_INTERVAL)
+
 # Dependency: get a DB session
 def get_db():
     db = SessionLocal()
@@ -41,6 +63,14 @@ def get_db():
     finally:
         db.close()
 
+# Dependency: get a session for read-only handlers (replica when configured)
+def get_read_db(request: Request):
+    db = read_router.read_session(_client_key(request), request.headers.get("x-read-pin"))
+    try:
+        yield db
+    finally:
+        db.close()
+
 # === API Key Protection ===
 # Admin key is required for privileged routes. Accept either `X-Admin-Key`
 # or an `Authorization: Bearer <token>` header to support standard clients.
@@ -58,6 +88,18 @@ def _extract_admin_key(request: Request) -> str | None:
             return token.strip()
     return None
 
+def _client_key(request: Request) -> str | None:
+    # Only admin clients read from replicas, so only they need pinning.
+    key = _extract_admin_key(request)
+    return f"key:{key}" if key else None
+
+# Keep admin clients on the primary right after they write (read-your-writes).
+# The signed `X-Read-Pin` token lets any worker honor the pin when echoed back.
+def pin_reads_to_primary(request: Request, response: Response):
+    token = read_router.record_write(_client_key(request))
+    if token:
+        response.headers["X-Read-Pin"] = token
+
 def verify_api_key(request: Request):
     if API_KEY is None:
         return
@@ -101,7 +143,7 @@ def normalize_tags(csv: str | None) -> str:
 def read_root():
     return {"message": "Job Tracker API is live"}
 
-@app.post("/jobs/", response_model=schemas.JobOut, dependencies=[Depends(verify_api_key)])
+@app.post("/jobs/", response_model=schemas.JobOut, dependencies=[Depends(verify_api_key), Depends(pin_reads_to_primary)])
 def create_job(job: schemas.JobCreate, db: Session = Depends(get_db)):
     job_data = job.dict()
 
@@ -124,6 +166,7 @@ def create_job(job: schemas.JobCreate, db: Session = Depends(get_db)):
 
     db_job = models.Job(**job_data)
     db.add(db_job)
+    bus.publish("jobs", session=db)
     db.commit()
     db.refresh(db_job)
     return db_job
@@ -134,18 +177,23 @@ def create_job(job: schemas.JobCreate, db: Session = Depends(get_db)):
     dependencies=[Depends(verify_api_key)],
 )
 def get_all_jobs(db: Session = Depends(get_db)):
-    return db.query(models.Job).all()
+    # Filled from the primary: a lagging replica could otherwise store stale
+    # rows under the new version. Cache hits keep this off the primary anyway.
+    return jobs_cache.get_or_compute(
+        "all", lambda: [schemas.JobOut.model_validate(job) for job in db.query(models.Job).all()]
+    )
 
-@app.delete("/jobs/{job_id}", dependencies=[Depends(verify_api_key)])
+@app.delete("/jobs/{job_id}", dependencies=[Depends(verify_api_key), Depends(pin_reads_to_primary)])
 def delete_job(job_id: int, db: Session = Depends(get_db)):
     job = db.get(models.Job, job_id)
     if not job:
         return {"error": "Job not found"}
     db.delete(job)
+    bus.publish("jobs", session=db)
     db.commit()
     return {"message": "Job deleted"}
 
-@app.put("/jobs/{job_id}", response_model=schemas.JobOut, dependencies=[Depends(verify_api_key)])
+@app.put("/jobs/{job_id}", response_model=schemas.JobOut, dependencies=[Depends(verify_api_key), Depends(pin_reads_to_primary)])
 def update_job(job_id: int, updated_job: schemas.JobCreate, db: Session = Depends(get_db)):
     job = db.get(models.Job, job_id)
     if not job:
@@ -205,6 +253,7 @@ def update_job(job_id: int, updated_job: schemas.JobCreate, db: Session = Depend
     for key, value in updated_data.items():
         setattr(job, key, value)
 
+    bus.publish("jobs", session=db)
     db.commit()
     db.refresh(job)
     return job
@@ -243,7 +292,12 @@ def analytics_heartbeat(payload: schemas.AnalyticsHeartbeat, db: Session = Depen
         )
         db.add(install)
     else:
-        install.last_seen = seen_at
+        # Client clocks and retries can send older timestamps; last_seen only
+        # moves forward, which the snapshot cursor on (last_seen, id) relies on.
+        install.last_seen = case(
+            (models.AnalyticsInstall.last_seen < seen_at, seen_at),
+            else_=models.AnalyticsInstall.last_seen,
+        )
         install.launch_count = (install.launch_count or 0) + 1
         install.mode = payload.mode
         install.version = payload.version
@@ -254,6 +308,7 @@ def analytics_heartbeat(payload: schemas.AnalyticsHeartbeat, db: Session = Depen
         ts=seen_at,
     )
     db.add(launch_event)
+    bus.publish("analytics", session=db, coalesce=ANALYTICS_PUBLISH_INTERVAL)
     db.commit()
     return Response(status_code=204)
 
@@ -276,12 +331,20 @@ def analytics_event(payload: schemas.AnalyticsEventIn, db: Session = Depends(get
         ts=event_ts,
     )
     db.add(event)
+    bus.publish("analytics", session=db, coalesce=ANALYTICS_PUBLISH_INTERVAL)
     db.commit()
     return Response(status_code=204)
 
 
 @app.get("/admin/stats", response_model=schemas.AdminStats, dependencies=[Depends(verify_api_key)])
-def admin_stats(db: Session = Depends(get_db)):
+def admin_stats(db: Session = Depends(get_read_db)):
+    # Activity windows are relative to now, so entries also roll over daily.
+    return stats_cache.get_or_compute(
+        ("stats", datetime.utcnow().date()), lambda: _compute_admin_stats(db)
+    )
+
+
+def _compute_admin_stats(db: Session) -> schemas.AdminStats:
     now = datetime.utcnow()
     seven_days_ago = now - timedelta(days=7)
     thirty_days_ago = now - timedelta(days=30)
@@ -398,3 +461,110 @@ def admin_stats(db: Session = Depends(get_db)):
         users_exported=users_exported,
         by_mode=by_mode,
     )
+
+
+@app.get("/admin/admission", dependencies=[Depends(verify_api_key)])
+def admin_admission():
+    return admission_controller.stats()
+
+
+# === Cohort retention & funnels ===
+FUNNEL_STEPS = ("launch", "job_create", "export_json")
+ANALYTICS_MODES = ("demo", "local", "admin")
+
+# Reports scan the whole events table. Like the stats they follow the shared
+# "analytics" version, so every worker serves the same result until new
+# telemetry arrives. A publish dropped by coalescing leaves them stale for at
+# most REPORT_MAX_AGE seconds.
+REPORT_MAX_AGE = 300.0
+report_cache = invalidation.VersionedCache(bus, "analytics", max_age=REPORT_MAX_AGE)
+
+
+def _event_variants(base_event: str) -> set[str]:
+    variants = {f"{base_event}_{mode}" for mode in ANALYTICS_MODES}
+    if base_event in ALLOWED_ANALYTICS_EVENTS:
+        variants.add(base_event)
+    return variants
+
+
+@app.get("/admin/retention", response_model=schemas.RetentionReport, dependencies=[Depends(verify_api_key)])
+def admin_retention(weeks: int = Query(8, ge=1, le=52), db: Session = Depends(get_read_db)):
+    def compute():
+        columns = analytics.fetch_columns(
+            db.connection(),
+            select(
+                models.AnalyticsEvent.install_id,
+                analytics.epoch_seconds(models.AnalyticsInstall.first_seen),
+                analytics.epoch_seconds(models.AnalyticsEvent.ts),
+            )
+            .join(models.AnalyticsInstall, models.AnalyticsEvent.install_id == models.AnalyticsInstall.id)
+            .where(models.AnalyticsEvent.event.in_(_event_variants("launch"))),
+            [("install_id", analytics.INSTALL_ID_DTYPE), ("first_seen", "i8"), ("ts", "i8")],
+        )
+        starts, sizes, retained = analytics.retention_matrix(
+            columns["install_id"], columns["first_seen"], columns["ts"], weeks, datetime.utcnow()
+        )
+        cohorts = [
+            schemas.RetentionCohort(
+                cohort_start=start,
+                size=size,
+                retained=counts,
+                rates=[None if c is None else round(c / size, 4) for c in counts],
+            )
+            for start, size, counts in zip(starts, sizes, retained)
+        ]
+        return schemas.RetentionReport(weeks=weeks, cohorts=cohorts)
+
+    # Keyed by date too: weeks that haven't happened yet are reported as None.
+    return report_cache.get_or_compute(("retention", weeks, datetime.utcnow().date()), compute)
+
+
+@app.get("/admin/funnel", response_model=schemas.FunnelReport, dependencies=[Depends(verify_api_key)])
+def admin_funnel(db: Session = Depends(get_read_db)):
+    def compute():
+        step_expr = case(
+            *[
+                (models.AnalyticsEvent.event.in_(_event_variants(step)), index)
+                for index, step in enumerate(FUNNEL_STEPS)
+            ],
+            else_=-1,
+        )
+        all_variants = set().union(*(_event_variants(step) for step in FUNNEL_STEPS))
+        columns = analytics.fetch_columns(
+            db.connection(),
+            select(
+                models.AnalyticsEvent.install_id,
+                step_expr,
+                analytics.epoch_seconds(models.AnalyticsEvent.ts),
+            ).where(models.AnalyticsEvent.event.in_(all_variants)),
+            [("install_id", analytics.INSTALL_ID_DTYPE), ("step", "i8"), ("ts", "i8")],
+        )
+        counts = analytics.funnel_counts(
+            columns["install_id"], columns["step"], columns["ts"], len(FUNNEL_STEPS)
+        )
+        top = counts[0] or 1
+        return schemas.FunnelReport(
+            steps=[
+                schemas.FunnelStep(step=step, installs=count, conversion=round(count / top, 4))
+                for step, count in zip(FUNNEL_STEPS, counts)
+            ]
+        )
+
+    return report_cache.get_or_compute("funnel", compute)
+
+
+# === Columnar snapshots ===
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+
+
+@app.post("/admin/export", response_model=list[schemas.ExportSummary], dependencies=[Depends(verify_api_key)])
+def admin_export(
+    format: Literal["parquet", "arrow"] = "parquet",
+    tables: str = Query(",".join(snapshot.DEFAULT_TABLES)),
+    db: Session = Depends(get_read_db),
+):
+    names = [name.strip() for name in tables.split(",") if name.strip()]
+    try:
+        return snapshot.export_snapshot(db, EXPORT_DIR, names, format)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from sqlalchemy import Column, Integer, String, Date, DateTime
 from sqlalchemy.dialects.sqlite import JSON
 from database import Base
@@ -25,6 +27,8 @@ class AnalyticsInstall(Base):
     launch_count = Column(Integer, default=0, nullable=False)
     mode = Column(String, nullable=True)
     version = Column(String, nullable=True)
+    # Server time of the last write; last_seen comes from the client.
+    recorded_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 class AnalyticsEvent(Base):
@@ -34,3 +38,5 @@ class AnalyticsEvent(Base):
     install_id = Column(String, nullable=False, index=True)
     event = Column(String, nullable=False)
     ts = Column(DateTime, nullable=False)
+    # Server time of the insert; ts comes from the client.
+    recorded_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,424 @@
+"""
+Query-plan checks for the statements the API issues.
+
+The tool seeds a scratch database, drives the API through a representative
+workload while recording every SQL statement, then runs `EXPLAIN QUERY PLAN`
+(SQLite) or `EXPLAIN (FORMAT JSON)` (PostgreSQL) on each one. Full scans of
+tables at or above `--threshold` rows are flagged, with a composite index
+suggested from the statement's filter and ordering columns where one would
+help.
+
+With `--check`, the plans of hot endpoints are compared with
+`query_plans_baseline.json`, which records the worst access to each table for
+every statement, keyed by endpoint and the statement's position in it (so
+rewording a query keeps its key). The run fails if any access got worse (an
+index lookup turning into an index scan or a full scan), or if a hot
+statement or table has no baseline entry yet.
+
+Usage:
+    python query_plans.py                                   # report on a temp SQLite db
+    python query_plans.py --database-url postgresql://...   # scratch PostgreSQL db
+    python query_plans.py --check                           # fail on plan regressions
+    python query_plans.py --update-baseline
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import count
+from uuid import uuid4
+
+from sqlalchemy import event, insert, inspect
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plans_baseline.json")
+DEFAULT_THRESHOLD = 1000
+DEFAULT_SEED_ROWS = 20_000
+
+# Endpoints whose statements are tracked against the baseline.
+HOT_PATHS = (
+    "GET /jobs/",
+    "GET /admin/stats",
+    "POST /analytics/heartbeat",
+    "POST /analytics/event",
+)
+
+# Ordered from best to worst; a higher rank in a later run is a regression.
+ACCESS_RANK = {"search": 0, "index_scan": 1, "scan": 2}
+
+_DML = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_SQLITE_ACCESS = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS \w+)?(.*)$")
+_explain_ids = count()
+
+
+def fingerprint(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+def statement_key(label: str, ordinal: int) -> str:
+    return f"{label} #{ordinal}"
+
+
+@contextmanager
+def capture_statements(engine):
+    """Record `(statement, parameters)` for every DML statement sent to `engine`."""
+    captured: list[tuple[str, object]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _DML.match(statement):
+            if executemany and parameters:
+                parameters = parameters[0]
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed(connection, rows: int):
+    """Insert `rows` analytics events (and one install per ten events)."""
+    import models
+
+    now = datetime.utcnow()
+    installs = [str(uuid4()) for _ in range(max(rows // 10, 1))]
+    modes = ("demo", "local", "admin")
+    connection.execute(
+        insert(models.AnalyticsInstall),
+        [
+            {
+                "id": install_id,
+                "first_seen": now - timedelta(days=i % 90),
+                "last_seen": now - timedelta(days=i % 30),
+                "launch_count": 10,
+                "mode": modes[i % 3],
+                "version": "seed",
+            }
+            for i, install_id in enumerate(installs)
+        ],
+    )
+    events = ("launch_{}", "job_create_{}", "job_update_{}", "export_json_{}")
+    connection.execute(
+        insert(models.AnalyticsEvent),
+        [
+            {
+                "install_id": installs[i % len(installs)],
+                "event": events[i % len(events)].format(modes[i % 3]),
+                "ts": now - timedelta(minutes=i),
+            }
+            for i in range(rows)
+        ],
+    )
+    connection.exec_driver_sql("ANALYZE")
+
+
+def _job_payload(**overrides):
+    payload = {
+        "title": "Backend Engineer",
+        "company": "Example Co",
+        "link": "https://example.com/jobs/1",
+        "status": "Applied",
+        "date_applied": "2025-01-01",
+        "notes": "",
+        "tags": "remote",
+        "status_history": [{"status": "Applied", "date": "2025-01-01"}],
+    }
+    payload.update(overrides)
+    return payload
+
+
+def run_workload(engine, client, headers) -> list[tuple[str, str, object]]:
+    """Drive each API route once and return `(label, statement, params)` rows."""
+    import main
+
+    install_id = str(uuid4())
+    ts = int(datetime.utcnow().timestamp() * 1000)
+    created = {}
+
+    def create_job():
+        created.update(client.post("/jobs/", headers=headers, json=_job_payload()).json())
+
+    steps = [
+        ("POST /jobs/", create_job),
+        ("GET /jobs/", lambda: client.get("/jobs/", headers=headers)),
+        ("PUT /jobs/{id}", lambda: client.put(f"/jobs/{created['id']}", headers=headers, json=_job_payload(status="Offer"))),
+        ("DELETE /jobs/{id}", lambda: client.delete(f"/jobs/{created['id']}", headers=headers)),
+        ("POST /analytics/heartbeat", lambda: client.post(
+            "/analytics/heartbeat", json={"id": install_id, "mode": "local", "version": "plan", "ts": ts}
+        )),
+        ("POST /analytics/event", lambda: client.post(
+            "/analytics/event", json={"id": install_id, "event": "job_create_local", "ts": ts}
+        )),
+        ("GET /admin/stats", lambda: client.get("/admin/stats", headers=headers)),
+        ("GET /admin/retention", lambda: client.get("/admin/retention", headers=headers)),
+        ("GET /admin/funnel", lambda: client.get("/admin/funnel", headers=headers)),
+    ]
+
+    recorded = []
+    for label, step in steps:
+        # Cached responses would hide the statements behind them.
+        for cache in (main.jobs_cache, main.stats_cache, main.report_cache):
+            cache.clear()
+        with capture_statements(engine) as captured:
+            step()
+        seen = set()
+        for statement, params in captured:
+            if fingerprint(statement) not in seen:
+                seen.add(fingerprint(statement))
+                recorded.append((label, statement, params))
+    return recorded
+
+
+def _sqlite_accesses(connection, statement, params):
+    # SQLite doesn't re-prepare a cached EXPLAIN after a schema change, so make
+    # each one unique to keep the driver's statement cache from replaying it.
+    sql = f"EXPLAIN QUERY PLAN /* {next(_explain_ids)} */ {statement}"
+    rows = connection.exec_driver_sql(sql, params or ()).all()
+    accesses = []
+    for row in rows:
+        match = _SQLITE_ACCESS.match(row[-1])
+        if not match:
+            continue
+        verb, table, rest = match.groups()
+        if verb == "SEARCH":
+            access = "search"
+        elif "INDEX" in rest:
+            access = "index_scan"
+        else:
+            access = "scan"
+        index = re.search(r"INDEX (\w+)", rest)
+        accesses.append({"table": table, "access": access, "index": index.group(1) if index else None})
+    return accesses
+
+
+def _postgres_accesses(connection, statement, params):
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", params or {}).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    accesses = []
+
+    def walk(node):
+        node_type = node.get("Node Type", "")
+        table = node.get("Relation Name")
+        if table and node_type == "Seq Scan":
+            accesses.append({"table": table, "access": "scan", "index": None})
+        elif table and node_type in ("Index Scan", "Index Only Scan", "Bitmap Heap Scan"):
+            has_cond = "Index Cond" in node or "Recheck Cond" in node
+            accesses.append({
+                "table": table,
+                "access": "search" if has_cond else "index_scan",
+                "index": node.get("Index Name"),
+            })
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return accesses
+
+
+def explain(connection, statement, params) -> list[dict]:
+    if connection.dialect.name == "postgresql":
+        return _postgres_accesses(connection, statement, params)
+    return _sqlite_accesses(connection, statement, params)
+
+
+def suggest_index(statement: str, table: str, existing: list[list[str]]) -> str | None:
+    """
+    Suggest an index on `table` for the statement's filter and ordering.
+
+    Equality and IN columns lead, followed by one range column or the ORDER BY
+    columns. Returns None when the statement has no usable predicate on the
+    table (a whole-table aggregate) or an existing index already leads with
+    the suggested columns.
+    """
+    sql = fingerprint(statement)
+    where = re.search(r"\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)", sql, re.IGNORECASE)
+    order = re.search(r"\bORDER BY\b(.*?)(?:\bLIMIT\b|$)", sql, re.IGNORECASE)
+    ref = rf"\b{re.escape(table)}\.(\w+)"
+
+    equality, ranges = [], []
+    if where:
+        for column, op in re.findall(rf"{ref}\s*(=|IN\b|>=|<=|>|<|BETWEEN\b)", where.group(1), re.IGNORECASE):
+            target = equality if op.upper() in ("=", "IN") else ranges
+            if column not in equality and column not in target:
+                target.append(column)
+    ordering = re.findall(ref, order.group(1)) if order else []
+
+    columns = equality + (ranges[:1] if ranges else [c for c in ordering if c not in equality])
+    if not columns:
+        return None
+    if any(index[: len(columns)] == columns for index in existing):
+        return None
+    return f"CREATE INDEX IF NOT EXISTS ix_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+
+
+def analyze(connection, recorded, threshold: int = DEFAULT_THRESHOLD) -> list[dict]:
+    """Explain each recorded statement and flag large full scans."""
+    inspector = inspect(connection)
+    sizes: dict[str, int] = {}
+    indexes: dict[str, list[list[str]]] = {}
+
+    def table_size(table):
+        if table not in sizes:
+            sizes[table] = connection.exec_driver_sql(f"SELECT count(*) FROM {table}").scalar()
+        return sizes[table]
+
+    def table_indexes(table):
+        if table not in indexes:
+            pk = inspector.get_pk_constraint(table).get("constrained_columns") or []
+            indexes[table] = [pk] + [ix["column_names"] for ix in inspector.get_indexes(table)]
+        return indexes[table]
+
+    report = []
+    ordinals: dict[str, int] = {}
+    for label, statement, params in recorded:
+        ordinals[label] = ordinals.get(label, 0) + 1
+        accesses = explain(connection, statement, params)
+        flags = []
+        for access in accesses:
+            if access["access"] == "scan" and table_size(access["table"]) >= threshold:
+                flags.append({
+                    "table": access["table"],
+                    "rows": table_size(access["table"]),
+                    "suggestion": suggest_index(statement, access["table"], table_indexes(access["table"])),
+                })
+        report.append({
+            "key": statement_key(label, ordinals[label]),
+            "label": label,
+            "statement": fingerprint(statement),
+            "accesses": accesses,
+            "flags": flags,
+        })
+    return report
+
+
+def _worst_by_table(accesses) -> dict[str, str]:
+    # A table accessed more than once is judged by its worst access.
+    worst: dict[str, str] = {}
+    for access in accesses:
+        previous = worst.get(access["table"])
+        if previous is None or ACCESS_RANK[access["access"]] > ACCESS_RANK[previous]:
+            worst[access["table"]] = access["access"]
+    return worst
+
+
+def baseline_from(report, hot_paths=HOT_PATHS) -> dict:
+    return {
+        entry["key"]: {"statement": entry["statement"], "accesses": _worst_by_table(entry["accesses"])}
+        for entry in report
+        if entry["label"] in hot_paths
+    }
+
+
+def regressions(report, baseline: dict, hot_paths=HOT_PATHS) -> list[str]:
+    """Describe hot statements whose table access got worse or that have no baseline entry."""
+    current = {entry["key"]: entry for entry in report if entry["label"] in hot_paths}
+    problems = []
+    for key in sorted(set(baseline) - set(current)):
+        problems.append(f"{key}: statement no longer issued; refresh the baseline")
+    for key, entry in current.items():
+        expected = baseline.get(key)
+        if expected is None:
+            problems.append(f"{key}: no baseline entry; run --update-baseline\n    {entry['statement']}")
+            continue
+        for table, now in _worst_by_table(entry["accesses"]).items():
+            was = expected["accesses"].get(table)
+            if was is None:
+                problems.append(f"{key}: {table} ({now}) has no baseline entry; run --update-baseline")
+            elif ACCESS_RANK[now] > ACCESS_RANK[was]:
+                problems.append(f"{key}: {table} went from {was} to {now}\n    {entry['statement']}")
+    return problems
+
+
+def load_baseline(path: str, dialect: str) -> dict:
+    try:
+        with open(path) as handle:
+            return json.load(handle).get(dialect, {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path: str, dialect: str, baseline: dict):
+    try:
+        with open(path) as handle:
+            data = json.load(handle)
+    except FileNotFoundError:
+        data = {}
+    data[dialect] = baseline
+    with open(path, "w") as handle:
+        json.dump(data, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def format_report(report) -> str:
+    lines = []
+    for entry in report:
+        if not entry["flags"]:
+            continue
+        lines.append(f"[{entry['label']}] {entry['statement']}")
+        for flag in entry["flags"]:
+            lines.append(f"  full scan of {flag['table']} ({flag['rows']} rows)")
+            if flag["suggestion"]:
+                lines.append(f"  suggest: {flag['suggestion']}")
+            else:
+                lines.append("  no index suggested: whole-table aggregate or an existing index already matches")
+    return "\n".join(lines) or "No full scans above the threshold."
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Explain the API's SQL and flag large full scans.")
+    parser.add_argument("--database-url", help="scratch database to seed (defaults to a temporary SQLite file)")
+    parser.add_argument("--seed-rows", type=int, default=DEFAULT_SEED_ROWS)
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--check", action="store_true", help="exit non-zero when a hot statement's table access got worse or is missing from the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args(argv)
+
+    tmp_dir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'plans.db')}"
+
+    # The app binds its engine at import time, so import it after choosing the URL.
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    headers = {"X-Admin-Key": app_main.API_KEY} if app_main.API_KEY else {}
+    engine = app_main.engine
+    with engine.begin() as connection:
+        seed(connection, args.seed_rows)
+    with TestClient(app_main.app) as client:
+        recorded = run_workload(engine, client, headers)
+    with engine.connect() as connection:
+        report = analyze(connection, recorded, args.threshold)
+    dialect = engine.dialect.name
+
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+    status = 0
+    if args.update_baseline:
+        save_baseline(args.baseline, dialect, baseline_from(report))
+        print(f"Baseline for {dialect} written to {args.baseline}")
+    elif args.check:
+        problems = regressions(report, load_baseline(args.baseline, dialect))
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        status = 1 if problems else 0
+
+    if tmp_dir:
+        engine.dispose()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional, List, Literal, Dict
 from uuid import UUID
+from datetime import date
 
 
 class StatusEntry(BaseModel):
@@ -58,3 +59,31 @@ class AdminStats(BaseModel):
     jobs_created: int
     users_exported: int
     by_mode: Dict[Literal["demo", "local", "admin"], ModeBucket]
+
+
+class RetentionCohort(BaseModel):
+    cohort_start: date
+    size: int
+    retained: List[Optional[int]]
+    rates: List[Optional[float]]
+
+
+class RetentionReport(BaseModel):
+    weeks: int
+    cohorts: List[RetentionCohort]
+
+
+class FunnelStep(BaseModel):
+    step: str
+    installs: int
+    conversion: float
+
+
+class FunnelReport(BaseModel):
+    steps: List[FunnelStep]
+
+
+class ExportSummary(BaseModel):
+    table: str
+    rows: int
+    files: List[str]
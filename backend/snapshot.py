@@ -0,0 +1,396 @@
+"""
+Columnar snapshots of analytics (and optionally job) tables.
+
+Rows are streamed from the database in day order, in batches of `batch_size`,
+and each day is written to one file in Hive-style partitions
+(`<table>/date=YYYY-MM-DD/part-*.parquet` or `.arrow`), so the output loads
+directly with `pandas.read_parquet`, `pyarrow.dataset` or DuckDB's
+`read_parquet(..., hive_partitioning=true)`. A `_watermarks.json` file in the
+output directory records the last exported key per table so later runs only
+write new rows.
+
+Usage: python snapshot.py --out exports --format parquet --tables analytics_events
+"""
+import argparse
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+import models
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+WATERMARK_FILE = "_watermarks.json"
+DEFAULT_BATCH_SIZE = 50_000
+
+LOCK_FILE = "_export.lock"
+# Rows are resumed by their server-assigned recorded_at, which is set before
+# the writing transaction commits. Only rows older than this are exported, so
+# a transaction that commits within the lag is still picked up by a later run.
+COMMIT_LAG = timedelta(seconds=60)
+# recorded_at given to rows that existed before the column was added (see
+# database.COLUMN_MIGRATIONS).
+_BACKFILLED_AT = datetime(1970, 1, 1)
+
+
+class TableSpec:
+    """How one table is selected, partitioned and resumed."""
+
+    def __init__(self, model, schema: pa.Schema, partition_by=None, cursor=(), encode=None):
+        self.model = model
+        self.schema = schema
+        self.partition_by = partition_by
+        # A server timestamp followed by a tiebreaker; empty means full snapshot.
+        self.cursor = cursor
+        self.encode = encode or {}
+
+    @property
+    def columns(self):
+        return [getattr(self.model, field.name) for field in self.schema]
+
+
+TABLES = {
+    "analytics_events": TableSpec(
+        models.AnalyticsEvent,
+        pa.schema([
+            ("id", pa.int64()),
+            ("install_id", pa.string()),
+            ("event", pa.string()),
+            ("ts", pa.timestamp("us")),
+            ("recorded_at", pa.timestamp("us")),
+        ]),
+        partition_by="ts",
+        cursor=("recorded_at", "id"),
+    ),
+    # Installs are updated in place, so each run re-exports rows written since
+    # the last one; readers keep the newest row per id.
+    "analytics_installs": TableSpec(
+        models.AnalyticsInstall,
+        pa.schema([
+            ("id", pa.string()),
+            ("first_seen", pa.timestamp("us")),
+            ("last_seen", pa.timestamp("us")),
+            ("launch_count", pa.int64()),
+            ("mode", pa.string()),
+            ("version", pa.string()),
+            ("recorded_at", pa.timestamp("us")),
+        ]),
+        partition_by="last_seen",
+        cursor=("recorded_at", "id"),
+    ),
+    # Jobs have no modification timestamp; every run writes a full snapshot
+    # partitioned by the export date.
+    "jobs": TableSpec(
+        models.Job,
+        pa.schema([
+            ("id", pa.int64()),
+            ("title", pa.string()),
+            ("company", pa.string()),
+            ("link", pa.string()),
+            ("status", pa.string()),
+            ("date_applied", pa.string()),
+            ("notes", pa.string()),
+            ("tags", pa.string()),
+            ("status_history", pa.string()),
+        ]),
+        encode={"status_history": json.dumps},
+    ),
+}
+DEFAULT_TABLES = ("analytics_events", "analytics_installs")
+
+
+def load_watermarks(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, WATERMARK_FILE)) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_watermarks(out_dir: str, watermarks: dict):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(f"{path}.tmp", "w") as handle:
+        json.dump(watermarks, handle, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+@contextmanager
+def _export_lock(out_dir: str):
+    """
+    Serialize runs against `out_dir` across threads and worker processes.
+
+    Without it two runs would read the same watermarks, write duplicate
+    parts and overwrite each other's watermark.
+    """
+    with open(os.path.join(out_dir, LOCK_FILE), "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _stored_watermark(spec: TableSpec, stored):
+    if not stored:
+        return None
+    if isinstance(stored, list):
+        # Written before the recorded_at cursor. Events were resumed by id and
+        # their older rows were backfilled with _BACKFILLED_AT; installs are
+        # simply re-exported once.
+        if spec.cursor == ("recorded_at", "id") and len(stored) == 1:
+            stored = {"recorded_at": _BACKFILLED_AT.isoformat(), "id": stored[0]}
+        else:
+            return None
+    return [_from_json(stored[col], spec.schema.field(col)) for col in spec.cursor]
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _from_json(value, field: pa.Field):
+    return datetime.fromisoformat(value) if pa.types.is_timestamp(field.type) else value
+
+
+class _PartitionWriters:
+    """
+    Write one file per day and publish them only on success.
+
+    Rows must arrive grouped by day: starting a new day closes the previous
+    file, so only one writer is open at a time. Batches are buffered until
+    `row_group_size` rows so day boundaries don't produce tiny row groups.
+    """
+
+    def __init__(self, table_dir: str, fmt: str, schema: pa.Schema, run_id: str, row_group_size: int):
+        self.table_dir = table_dir
+        self.fmt = fmt
+        self.schema = schema
+        self.run_id = run_id
+        self.row_group_size = row_group_size
+        self._day: str | None = None
+        self._writer = None
+        self._pending: list[pa.RecordBatch] = []
+        self._pending_rows = 0
+        self._paths: list[str] = []
+
+    def write(self, day: str, batch: pa.RecordBatch):
+        if day != self._day:
+            self._finish()
+            self._open(day)
+        self._pending.append(batch)
+        self._pending_rows += batch.num_rows
+        if self._pending_rows >= self.row_group_size:
+            self._flush()
+
+    def _open(self, day: str):
+        part_dir = os.path.join(self.table_dir, f"date={day}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"part-{self.run_id}{FORMATS[self.fmt]}")
+        sink = f"{path}.tmp"
+        if self.fmt == "parquet":
+            self._writer = pq.ParquetWriter(sink, self.schema)
+        else:
+            self._writer = ipc.new_file(sink, self.schema)
+        self._day = day
+        self._paths.append(path)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        table = pa.Table.from_batches(self._pending, schema=self.schema)
+        if self.fmt == "parquet":
+            self._writer.write_table(table, row_group_size=table.num_rows)
+        else:
+            self._writer.write_table(table, max_chunksize=table.num_rows)
+        self._pending = []
+        self._pending_rows = 0
+
+    def _finish(self):
+        if self._writer is None:
+            return
+        self._flush()
+        self._writer.close()
+        self._writer = None
+        self._day = None
+
+    def close(self, commit: bool) -> list[str]:
+        if commit:
+            self._finish()
+        elif self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for path in self._paths:
+            if commit:
+                os.replace(f"{path}.tmp", path)
+            else:
+                os.remove(f"{path}.tmp")
+        paths = sorted(self._paths) if commit else []
+        self._paths = []
+        self._pending = []
+        self._pending_rows = 0
+        return paths
+
+
+def _drop_older_parts(part_dir: str, keep: list[str]):
+    """Keep only the newest full snapshot within a day's partition."""
+    if not keep or not os.path.isdir(part_dir):
+        return
+    for entry in os.listdir(part_dir):
+        path = os.path.join(part_dir, entry)
+        if path not in keep and entry.startswith("part-"):
+            os.remove(path)
+
+
+def _upper_bound(db: Session, spec: TableSpec, watermark, cutoff: datetime):
+    """Highest cursor key past `watermark` recorded by `cutoff`, fixing the range one run exports."""
+    cursor_cols = [getattr(spec.model, name) for name in spec.cursor]
+    stmt = (
+        select(*cursor_cols)
+        .where(cursor_cols[0] <= cutoff)
+        .order_by(*[col.desc() for col in cursor_cols])
+        .limit(1)
+    )
+    if watermark is not None:
+        stmt = stmt.where(tuple_(*cursor_cols) > tuple_(*watermark))
+    row = db.execute(stmt).first()
+    return None if row is None else list(row)
+
+
+def _batches(db: Session, spec: TableSpec, watermark, upper, batch_size: int) -> Iterable[list]:
+    stmt = select(*spec.columns)
+    order_by = []
+    if spec.partition_by:
+        order_by.append(getattr(spec.model, spec.partition_by))
+    if spec.cursor:
+        cursor_cols = [getattr(spec.model, name) for name in spec.cursor]
+        if watermark is not None:
+            stmt = stmt.where(tuple_(*cursor_cols) > tuple_(*watermark))
+        stmt = stmt.where(tuple_(*cursor_cols) <= tuple_(*upper))
+        order_by.extend(cursor_cols)
+    if order_by:
+        stmt = stmt.order_by(*order_by)
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    yield from result.partitions(batch_size)
+
+
+def _day_runs(values: list) -> Iterable[tuple[str, int, int]]:
+    """Yield (day, start, length) for each run of rows sharing a day."""
+    start = 0
+    for i in range(1, len(values) + 1):
+        if i == len(values) or values[i].date() != values[start].date():
+            yield values[start].date().isoformat(), start, i - start
+            start = i
+
+
+def export_table(
+    db: Session,
+    name: str,
+    out_dir: str,
+    fmt: str = "parquet",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    watermarks: dict | None = None,
+    today: date | None = None,
+) -> dict:
+    """
+    Append rows of `name` newer than its stored watermark to `out_dir`.
+
+    Returns a summary with the row count and written files. `watermarks` is
+    updated in place; the caller is responsible for persisting it.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    spec = TABLES[name]
+    watermarks = {} if watermarks is None else watermarks
+    watermark = _stored_watermark(spec, watermarks.get(name))
+
+    today = today or datetime.utcnow().date()
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    names = spec.schema.names
+    partition_index = names.index(spec.partition_by) if spec.partition_by else None
+    upper = None
+    if spec.cursor:
+        # Rows stream in partition order, which for events differs from the
+        # cursor order, so bound the range up front and resume from its end.
+        upper = _upper_bound(db, spec, watermark, datetime.utcnow() - COMMIT_LAG)
+        if upper is None:
+            return {"table": name, "rows": 0, "files": []}
+    writers = _PartitionWriters(os.path.join(out_dir, name), fmt, spec.schema, run_id, batch_size)
+    rows_written = 0
+    try:
+        for rows in _batches(db, spec, watermark, upper, batch_size):
+            columns = [list(col) for col in zip(*rows)]
+            for col_name, encode in spec.encode.items():
+                index = names.index(col_name)
+                columns[index] = [None if v is None else encode(v) for v in columns[index]]
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, spec.schema)],
+                schema=spec.schema,
+            )
+            if partition_index is None:
+                writers.write(today.isoformat(), batch)
+            else:
+                for day, start, length in _day_runs(columns[partition_index]):
+                    writers.write(day, batch.slice(start, length))
+            rows_written += len(rows)
+    except BaseException:
+        writers.close(commit=False)
+        raise
+    files = writers.close(commit=True)
+    if not spec.cursor:
+        _drop_older_parts(os.path.join(out_dir, name, f"date={today.isoformat()}"), files)
+
+    if upper is not None:
+        watermarks[name] = {col: _to_json(value) for col, value in zip(spec.cursor, upper)}
+    return {"table": name, "rows": rows_written, "files": files}
+
+
+def export_snapshot(
+    db: Session,
+    out_dir: str,
+    tables: Iterable[str] = DEFAULT_TABLES,
+    fmt: str = "parquet",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> list[dict]:
+    """Export each table incrementally and advance the stored watermarks."""
+    tables = list(tables)
+    unknown = [name for name in tables if name not in TABLES]
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(unknown)}")
+    os.makedirs(out_dir, exist_ok=True)
+    with _export_lock(out_dir):
+        watermarks = load_watermarks(out_dir)
+        summaries = []
+        for name in tables:
+            summaries.append(export_table(db, name, out_dir, fmt, batch_size, watermarks))
+            _save_watermarks(out_dir, watermarks)
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export analytics tables to Arrow IPC or Parquet.")
+    parser.add_argument("--out", default=os.getenv("EXPORT_DIR", "exports"))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--tables", default=",".join(DEFAULT_TABLES), help=f"comma-separated subset of {', '.join(TABLES)}")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        summaries = export_snapshot(
+            db, args.out, [t.strip() for t in args.tables.split(",") if t.strip()], args.format, args.batch_size
+        )
+    for summary in summaries:
+        print(f"{summary['table']}: {summary['rows']} rows, {len(summary['files'])} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import os
 import tempfile
 from importlib import import_module
 import atexit
+import shutil
 
 TEST_DB_FD, TEST_DB_PATH = tempfile.mkstemp(suffix=".db")
 os.close(TEST_DB_FD)
@@ -27,6 +28,7 @@ Base.metadata.create_all(bind=engine)
 MainModule.API_KEY = API_KEY
 
 atexit.register(lambda: os.path.exists(TEST_DB_PATH) and os.remove(TEST_DB_PATH))
+atexit.register(lambda: shutil.rmtree(f"{TEST_DB_PATH}.bus", ignore_errors=True))
 
 SessionTesting = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
@@ -52,6 +54,10 @@ def client(db_session):
             pass
 
     MainModule.app.dependency_overrides[MainModule.get_db] = override_get_db
+    MainModule.app.dependency_overrides[MainModule.get_read_db] = override_get_db
+    # Each test rolls its data back, so cached results must not leak across tests.
+    for cache in (MainModule.jobs_cache, MainModule.stats_cache, MainModule.report_cache):
+        cache.clear()
     with TestClient(MainModule.app) as test_client:
         yield test_client
     MainModule.app.dependency_overrides.clear()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+from freezegun import freeze_time
+
+import analytics
+import main
+import models
+from invalidation import FileBus
+
+
+def _ms(value: str) -> int:
+    dt = datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _launch(client, install_id, when, mode="local"):
+    response = client.post(
+        "/analytics/heartbeat",
+        json={"id": install_id, "mode": mode, "version": "test", "ts": _ms(when)},
+    )
+    assert response.status_code == 204
+
+
+def _event(client, install_id, event, when):
+    response = client.post(
+        "/analytics/event", json={"id": install_id, "event": event, "ts": _ms(when)}
+    )
+    assert response.status_code == 204
+
+
+@pytest.fixture(autouse=True)
+def _clear_report_cache():
+    main.report_cache.clear()
+    yield
+    main.report_cache.clear()
+
+
+@pytest.fixture()
+def seeded(client):
+    a, b, c = (str(uuid4()) for _ in range(3))
+    for when in ("2025-01-06T09:00:00", "2025-01-14T09:00:00", "2025-01-15T09:00:00", "2025-01-28T09:00:00"):
+        _launch(client, a, when)
+    _event(client, a, "job_create_local", "2025-01-06T10:00:00")
+    _event(client, a, "export_json_local", "2025-01-14T10:00:00")
+
+    _event(client, b, "job_create_demo", "2025-01-06T08:00:00")
+    _launch(client, b, "2025-01-07T09:00:00", mode="demo")
+
+    _launch(client, c, "2025-01-20T09:00:00")
+    _launch(client, c, "2025-01-27T09:00:00")
+    _event(client, c, "job_create", "2025-01-21T09:00:00")
+    return a, b, c
+
+
+def test_retention_matrix_by_weekly_cohort(client, admin_headers, seeded):
+    with freeze_time("2025-02-01T12:00:00Z"):
+        response = client.get("/admin/retention?weeks=6", headers=admin_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["weeks"] == 6
+
+    first, second = data["cohorts"]
+    assert first["cohort_start"] == "2025-01-06"
+    assert first["size"] == 2
+    assert first["retained"] == [2, 1, 0, 1, None, None]
+    assert first["rates"] == [1.0, 0.5, 0.0, 0.5, None, None]
+
+    assert second["cohort_start"] == "2025-01-20"
+    assert second["size"] == 1
+    assert second["retained"] == [1, 1, None, None, None, None]
+
+
+def test_funnel_requires_ordered_steps(client, admin_headers, seeded):
+    with freeze_time("2025-02-01T12:00:00Z"):
+        response = client.get("/admin/funnel", headers=admin_headers)
+    assert response.status_code == 200
+    steps = response.json()["steps"]
+    assert [s["step"] for s in steps] == ["launch", "job_create", "export_json"]
+    assert [s["installs"] for s in steps] == [3, 2, 1]
+    assert steps[1]["conversion"] == pytest.approx(0.6667)
+
+
+def test_reports_fetch_in_chunks(client, admin_headers, seeded, monkeypatch):
+    monkeypatch.setattr(analytics, "FETCH_CHUNK_ROWS", 2)
+    with freeze_time("2025-02-01T12:00:00Z"):
+        steps = client.get("/admin/funnel", headers=admin_headers).json()["steps"]
+        cohorts = client.get("/admin/retention?weeks=6", headers=admin_headers).json()["cohorts"]
+    assert [s["installs"] for s in steps] == [3, 2, 1]
+    assert [c["size"] for c in cohorts] == [2, 1]
+
+
+def test_reports_follow_the_shared_analytics_version(client, admin_headers, db_session, seeded, monkeypatch):
+    monkeypatch.setattr(main, "ANALYTICS_PUBLISH_INTERVAL", 0.0)
+    with freeze_time("2025-02-01T12:00:00Z"):
+        before = client.get("/admin/funnel", headers=admin_headers).json()
+        # Rows written without a publish don't change the cached report.
+        db_session.add(models.AnalyticsEvent(install_id=str(uuid4()), event="launch_local", ts=datetime(2025, 1, 30)))
+        db_session.commit()
+        assert client.get("/admin/funnel", headers=admin_headers).json() == before
+
+        # A publish from any worker refreshes it.
+        FileBus(main.bus.directory).publish("analytics")
+        assert client.get("/admin/funnel", headers=admin_headers).json()["steps"][0]["installs"] == 4
+
+        _launch(client, str(uuid4()), "2025-01-30T09:00:00")
+        assert client.get("/admin/funnel", headers=admin_headers).json()["steps"][0]["installs"] == 5
+
+
+def test_reports_empty_and_require_admin(client, admin_headers):
+    assert client.get("/admin/retention").status_code == 401
+    assert client.get("/admin/retention", headers=admin_headers).json()["cohorts"] == []
+    steps = client.get("/admin/funnel", headers=admin_headers).json()["steps"]
+    assert [s["installs"] for s in steps] == [0, 0, 0]
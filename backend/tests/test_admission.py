@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from uuid import uuid4
+
+import httpx
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import main
+from admission import Lane
+from database import Base, make_engine
+
+
+CHECKOUT_SECONDS = 0.03
+
+
+@pytest.fixture()
+def slow_pool(client, tmp_path, monkeypatch):
+    """
+    Serve main.app's sync handlers from a one-connection pool with slow checkouts.
+
+    Requests get their own session on a scratch database; the pool slot is
+    only held while "checking out", so waiting requests block threads just
+    like an exhausted SQLAlchemy pool would.
+    """
+    scratch = make_engine(f"sqlite:///{tmp_path / 'flood.db'}")
+    Base.metadata.create_all(bind=scratch)
+    sessions = sessionmaker(bind=scratch, autoflush=False, autocommit=False)
+    pool = threading.Lock()
+
+    def slow_db():
+        with pool:
+            time.sleep(CHECKOUT_SECONDS)
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_db, slow_db)
+    yield
+    scratch.dispose()
+
+
+def _use_lanes(monkeypatch, telemetry_limit):
+    lanes = {
+        "telemetry": Lane("telemetry", limit=telemetry_limit, queue_limit=4, max_wait=0.05),
+        "admin": Lane("admin", limit=4, queue_limit=16, max_wait=5.0),
+    }
+    monkeypatch.setattr(main.admission_controller, "lanes", lanes)
+    return lanes
+
+
+async def _jobs_latency(admin_headers, heartbeats=0):
+    """Worst latency of a few GET /jobs/ calls while `heartbeats` are in flight."""
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        flood = [
+            asyncio.create_task(client.post("/analytics/heartbeat", json={
+                "id": str(uuid4()), "mode": "demo", "version": "test", "ts": 1735732800000,
+            }))
+            for _ in range(heartbeats)
+        ]
+        await asyncio.sleep(0.01)
+        latencies = []
+        for _ in range(3):
+            started = time.perf_counter()
+            response = await client.get("/jobs/", headers=admin_headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+        statuses = [r.status_code for r in await asyncio.gather(*flood)]
+    return max(latencies), statuses
+
+
+def test_admin_latency_holds_steady_under_heartbeat_flood(slow_pool, admin_headers, monkeypatch):
+    _use_lanes(monkeypatch, telemetry_limit=1000)
+    unloaded, _ = asyncio.run(_jobs_latency(admin_headers))
+    unprotected, _ = asyncio.run(_jobs_latency(admin_headers, heartbeats=40))
+
+    lanes = _use_lanes(monkeypatch, telemetry_limit=2)
+    protected, statuses = asyncio.run(_jobs_latency(admin_headers, heartbeats=40))
+
+    # Without lanes /jobs/ queues behind every heartbeat for the connection;
+    # with them it only waits for the couple of heartbeats admitted.
+    assert unprotected > 5 * unloaded
+    assert protected < 5 * unloaded
+    assert statuses.count(204) >= 2
+    assert statuses.count(429) > 0
+
+    telemetry = lanes["telemetry"].stats()
+    assert telemetry["rejected_queue_full"] == statuses.count(429)
+    assert telemetry["rejected_timeout"] == statuses.count(503)
+    assert telemetry["active"] == 0 and telemetry["queued"] == 0
+    assert lanes["admin"].stats()["rejected_queue_full"] == 0
+
+
+def test_queued_request_gets_slot_on_release():
+    async def scenario():
+        lane = Lane("admin", limit=1, queue_limit=1, max_wait=1.0)
+        assert await lane.acquire() is None
+        waiting = asyncio.create_task(lane.acquire())
+        await asyncio.sleep(0)
+        assert await lane.acquire() == "queue_full"
+        lane.release()
+        assert await waiting is None
+        lane.release()
+        return lane.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["admitted"] == 2
+    assert stats["active"] == 0
+    assert stats["rejected_queue_full"] == 1
+
+
+def test_exhausted_telemetry_is_rejected_with_retry_after(client, admin_headers, monkeypatch):
+    monkeypatch.setitem(
+        main.admission_controller.lanes,
+        "telemetry",
+        Lane("telemetry", limit=0, queue_limit=0, max_wait=0.0),
+    )
+    response = client.post(
+        "/analytics/heartbeat",
+        json={"id": str(uuid4()), "mode": "demo", "version": "test", "ts": 1735732800000},
+    )
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    assert client.get("/jobs/", headers=admin_headers).status_code == 200
+    stats = client.get("/admin/admission", headers=admin_headers).json()
+    assert stats["telemetry"]["rejected_queue_full"] == 1
+    assert stats["admin"]["admitted"] >= 1
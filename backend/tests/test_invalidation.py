@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import socket
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+import psycopg2
+from sqlalchemy import make_url
+
+import main
+import models
+from database import make_engine
+from invalidation import CHANNEL, FileBus, LocalBus, PostgresBus, VersionedCache, bus_for
+
+from .factories import job_payload
+
+
+def test_file_bus_shares_versions_between_workers(tmp_path):
+    worker_a = FileBus(str(tmp_path / "bus"))
+    worker_b = FileBus(str(tmp_path / "bus"))
+    assert worker_a.version("jobs") == worker_b.version("jobs") == ""
+
+    worker_a.publish("jobs")
+    seen = worker_b.version("jobs")
+    assert seen != ""
+    assert worker_a.version("jobs") == seen
+
+    worker_b.publish("jobs")
+    assert worker_a.version("jobs") != seen
+    assert worker_a.version("analytics") == ""
+
+
+def test_versioned_cache_recomputes_after_remote_publish(tmp_path):
+    cache = VersionedCache(FileBus(str(tmp_path / "bus")), "jobs")
+    other_worker = FileBus(str(tmp_path / "bus"))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute("all", compute) == 1
+    assert cache.get_or_compute("all", compute) == 1
+    other_worker.publish("jobs")
+    assert cache.get_or_compute("all", compute) == 2
+
+
+def test_bus_for_matches_database(tmp_path):
+    assert isinstance(bus_for(make_engine(f"sqlite:///{tmp_path}/jobs.db")), FileBus)
+    assert isinstance(bus_for(make_engine("sqlite://")), LocalBus)
+
+
+def test_job_edit_in_another_worker_invalidates_list(client, admin_headers, db_session):
+    created = client.post("/jobs/", headers=admin_headers, json=job_payload()).json()
+    assert [job["id"] for job in client.get("/jobs/", headers=admin_headers).json()] == [created["id"]]
+
+    # Another worker deletes the job: the row goes away, then it publishes.
+    db_session.delete(db_session.get(models.Job, created["id"]))
+    db_session.flush()
+    assert len(client.get("/jobs/", headers=admin_headers).json()) == 1
+
+    FileBus(main.bus.directory).publish("jobs")
+    assert client.get("/jobs/", headers=admin_headers).json() == []
+
+
+def test_analytics_writes_refresh_stats(client, admin_headers, monkeypatch):
+    # Earlier tests may have published within the coalescing window.
+    monkeypatch.setattr(main, "ANALYTICS_PUBLISH_INTERVAL", 0.0)
+    assert client.get("/admin/stats", headers=admin_headers).json()["unique_installs"] == 0
+    client.post(
+        "/analytics/heartbeat",
+        json={"id": str(uuid4()), "mode": "demo", "version": "test", "ts": 1735732800000},
+    )
+    assert client.get("/admin/stats", headers=admin_headers).json()["unique_installs"] == 1
+
+
+def test_bump_all_invalidates_topics_only_read_so_far():
+    bus = LocalBus()
+    cache = VersionedCache(bus, "jobs")
+    assert cache.get_or_compute("all", lambda: "old") == "old"
+    bus._bump_all()
+    assert cache.get_or_compute("all", lambda: "new") == "new"
+
+
+def test_coalesced_publishes_bounded_by_cache_max_age(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("invalidation.time.monotonic", lambda: clock[0])
+    bus = LocalBus()
+    cache = VersionedCache(bus, "analytics", max_age=1.0)
+
+    bus.publish("analytics", coalesce=1.0)
+    first = bus.version("analytics")
+    bus.publish("analytics", coalesce=1.0)
+    assert bus.version("analytics") == first
+
+    assert cache.get_or_compute("stats", lambda: 1) == 1
+    clock[0] += 0.5
+    assert cache.get_or_compute("stats", lambda: 2) == 1
+    clock[0] += 0.6
+    assert cache.get_or_compute("stats", lambda: 3) == 3
+    bus.publish("analytics", coalesce=1.0)
+    assert bus.version("analytics") != first
+
+
+def _postgres_bus(**kwargs):
+    engine = SimpleNamespace(url=make_url("postgresql+psycopg2://user:secret@db/joblog"))
+    return PostgresBus(engine, start=False, **kwargs)
+
+
+def test_postgres_publish_notifies_inside_the_session_transaction(db_session):
+    notified = []
+    driver = db_session.connection().connection.driver_connection
+    driver.create_function("pg_notify", 2, lambda channel, topic: notified.append((channel, topic)))
+    bus = _postgres_bus()
+    before = bus.version("jobs")
+
+    bus.publish("jobs", session=db_session)
+    assert notified == [(CHANNEL, "jobs")]
+    assert bus.version("jobs") == before
+
+    db_session.commit()
+    assert bus.version("jobs") != before
+
+
+class _FakeListenConnection:
+    """Just enough of a psycopg2 connection for the listener loop."""
+
+    def __init__(self):
+        self._reader, self._writer = socket.socketpair()
+        self.notifies = []
+        self.executed = []
+
+    def fileno(self):
+        return self._reader.fileno()
+
+    def set_isolation_level(self, level):
+        pass
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                connection.executed.append(sql)
+
+        return Cursor()
+
+    def notify(self, topic):
+        self.notifies.append(SimpleNamespace(payload=topic))
+        self._writer.send(b"x")
+
+    def poll(self):
+        self._reader.recv(1024)
+
+    def close(self):
+        self._reader.close()
+        self._writer.close()
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_postgres_listener_invalidates_on_listen_and_notify(monkeypatch):
+    connection = _FakeListenConnection()
+    dsns = []
+    monkeypatch.setattr(psycopg2, "connect", lambda dsn: dsns.append(dsn) or connection)
+    bus = _postgres_bus(poll_timeout=0.05)
+    cache = VersionedCache(bus, "jobs")
+    assert cache.get_or_compute("all", lambda: "before listen") == "before listen"
+
+    bus._thread.start()
+    try:
+        assert _wait_for(lambda: connection.executed == [f"LISTEN {CHANNEL}"])
+        # Anything published before LISTEN may have been missed.
+        assert _wait_for(lambda: bus.version("jobs") != (0, 0))
+        assert cache.get_or_compute("all", lambda: "after listen") == "after listen"
+
+        seen = bus.version("jobs")
+        connection.notify("jobs")
+        assert _wait_for(lambda: bus.version("jobs") != seen)
+    finally:
+        bus.stop()
+        bus._thread.join(timeout=2)
+    assert dsns == ["postgresql://user:secret@db/joblog"]
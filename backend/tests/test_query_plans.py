@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import pytest
+
+import query_plans
+from database import INDEX_STATEMENTS, engine
+
+
+@pytest.fixture()
+def plan_connection(db_session):
+    # The test schema is built without ensure_indexes(); add them inside the
+    # rolled-back transaction so plans match a real deployment.
+    connection = db_session.connection()
+    for stmt in INDEX_STATEMENTS:
+        connection.exec_driver_sql(stmt)
+    query_plans.seed(connection, 2000)
+    return connection
+
+
+@pytest.fixture()
+def report(client, admin_headers, plan_connection):
+    recorded = query_plans.run_workload(engine, client, admin_headers)
+    return query_plans.analyze(plan_connection, recorded, threshold=100)
+
+
+def test_workload_captures_every_route(report):
+    labels = {entry["label"] for entry in report}
+    assert set(query_plans.HOT_PATHS) <= labels
+    assert {"POST /jobs/", "PUT /jobs/{id}", "DELETE /jobs/{id}", "GET /admin/funnel"} <= labels
+
+    heartbeat_lookup = [
+        entry for entry in report
+        if entry["label"] == "POST /analytics/heartbeat" and entry["accesses"]
+    ]
+    assert heartbeat_lookup[0]["accesses"][0]["access"] == "search"
+    assert any(
+        flag["table"] == "analytics_installs"
+        for entry in report if entry["label"] == "GET /admin/stats"
+        for flag in entry["flags"]
+    )
+
+
+def test_hot_queries_match_committed_baseline(report):
+    baseline = query_plans.load_baseline(query_plans.BASELINE_PATH, "sqlite")
+    assert baseline
+    assert query_plans.regressions(report, baseline) == []
+
+
+def test_dropped_index_is_reported_as_regression(client, admin_headers, plan_connection, report):
+    baseline = query_plans.baseline_from(report)
+    assert baseline["GET /admin/stats #2"]["accesses"] == {"analytics_events": "search"}
+    plan_connection.exec_driver_sql("DROP INDEX ix_analytics_events_event_install_id_ts")
+
+    recorded = query_plans.run_workload(engine, client, admin_headers)
+    problems = query_plans.regressions(query_plans.analyze(plan_connection, recorded), baseline)
+    assert problems
+    assert problems[0].startswith("GET /admin/stats #2: analytics_events went from search to scan\n")
+    assert all(problem.startswith("GET /admin/stats #") for problem in problems)
+
+
+def test_statements_missing_from_baseline_are_reported(report):
+    baseline = query_plans.baseline_from(report)
+    del baseline["GET /jobs/ #1"]
+    del baseline["GET /admin/stats #1"]["accesses"]["analytics_installs"]
+    baseline["GET /old/route #1"] = {"statement": "SELECT 1", "accesses": {}}
+
+    problems = query_plans.regressions(report, baseline)
+    assert problems[0] == "GET /old/route #1: statement no longer issued; refresh the baseline"
+    assert problems[1].startswith("GET /jobs/ #1: no baseline entry; run --update-baseline\n    SELECT jobs.id")
+    assert problems[2] == "GET /admin/stats #1: analytics_installs (scan) has no baseline entry; run --update-baseline"
+    assert len(problems) == 3
+
+
+def test_suggest_index_orders_equality_before_range():
+    statement = (
+        "SELECT analytics_events.id FROM analytics_events "
+        "WHERE analytics_events.ts >= ? AND analytics_events.install_id = ? "
+        "ORDER BY analytics_events.ts"
+    )
+    assert query_plans.suggest_index(statement, "analytics_events", [["id"]]) == (
+        "CREATE INDEX IF NOT EXISTS ix_analytics_events_install_id_ts "
+        "ON analytics_events (install_id, ts)"
+    )
+    assert query_plans.suggest_index(statement, "analytics_events", [["install_id", "ts"]]) is None
+    assert query_plans.suggest_index("SELECT count(*) FROM analytics_events", "analytics_events", []) is None
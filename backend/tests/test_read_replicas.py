@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+
+import main
+from database import ReplicaRouter, make_engine
+
+from .factories import job_payload
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _sqlite_engine(name):
+    path = os.path.join(tempfile.mkdtemp(), f"{name}.db")
+    engine = make_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE whoami (name TEXT)"))
+        connection.execute(text("INSERT INTO whoami VALUES (:name)"), {"name": name})
+    return engine
+
+
+def _whoami(session):
+    try:
+        return session.execute(text("SELECT name FROM whoami")).scalar_one()
+    finally:
+        session.close()
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture()
+def router(clock):
+    router = ReplicaRouter(
+        _sqlite_engine("primary"),
+        [_sqlite_engine("replica_a"), _sqlite_engine("replica_b")],
+        pin_seconds=5,
+        health_interval=10,
+        clock=clock,
+        secret="test-secret",
+    )
+    router.check_health()
+    return router
+
+
+def test_reads_round_robin_across_replicas(router):
+    names = [_whoami(router.read_session("client")) for _ in range(4)]
+    assert names == ["replica_a", "replica_b", "replica_a", "replica_b"]
+
+
+def test_recent_writer_is_pinned_to_primary(router, clock):
+    router.record_write("writer")
+    assert _whoami(router.read_session("writer")) == "primary"
+    assert _whoami(router.read_session("someone-else")).startswith("replica")
+
+    clock.now += 6
+    assert _whoami(router.read_session("writer")).startswith("replica")
+
+
+def test_pin_token_is_honored_by_other_workers(router, clock):
+    token = router.record_write("writer")
+    other_worker = ReplicaRouter(router.primary, router.replicas, clock=clock, secret="test-secret")
+    other_worker.check_health()
+
+    assert _whoami(other_worker.read_session("writer")).startswith("replica")
+    assert _whoami(other_worker.read_session("writer", token)) == "primary"
+    assert _whoami(other_worker.read_session("someone-else", token)).startswith("replica")
+    assert _whoami(other_worker.read_session("writer", token[:-1] + "0")).startswith("replica")
+
+    clock.now += 7
+    assert _whoami(other_worker.read_session("writer", token)).startswith("replica")
+
+
+def test_unhealthy_replicas_fall_back_to_primary(router):
+    router.replicas[0] = make_engine("sqlite:////nonexistent/dir/replica.db")
+    router.check_health()
+    assert [_whoami(router.read_session()) for _ in range(3)] == ["replica_b"] * 3
+
+    router.replicas[1] = make_engine("sqlite:////nonexistent/dir/other.db")
+    router.check_health()
+    assert _whoami(router.read_session()) == "primary"
+
+
+def test_replicas_are_unused_until_probed(clock):
+    router = ReplicaRouter(_sqlite_engine("primary"), [_sqlite_engine("replica_a")], clock=clock)
+    assert _whoami(router.read_session()) == "primary"
+
+    router.check_health()
+    assert _whoami(router.read_session()) == "replica_a"
+
+
+def test_without_replicas_reads_use_primary(clock):
+    router = ReplicaRouter(_sqlite_engine("primary"), clock=clock)
+    router.record_write("writer")
+    assert _whoami(router.read_session("writer")) == "primary"
+    assert _whoami(router.read_session()) == "primary"
+
+
+def test_admin_writes_pin_the_admin_client(client, admin_headers, monkeypatch):
+    router = ReplicaRouter(_sqlite_engine("primary"), [_sqlite_engine("replica_a")])
+    monkeypatch.setattr(main, "read_router", router)
+
+    client.get("/jobs/", headers=admin_headers)
+    assert not router.is_pinned(f"key:{admin_headers['X-Admin-Key']}")
+
+    response = client.post("/jobs/", headers=admin_headers, json=job_payload())
+    assert router.is_pinned(f"key:{admin_headers['X-Admin-Key']}")
+
+    other_worker = ReplicaRouter(router.primary, router.replicas)
+    assert other_worker.is_pinned(f"key:{admin_headers['X-Admin-Key']}", response.headers["X-Read-Pin"])
+
+
+def test_anonymous_and_non_database_posts_are_not_pinned(client, admin_headers, monkeypatch, tmp_path):
+    router = ReplicaRouter(_sqlite_engine("primary"), [_sqlite_engine("replica_a")])
+    monkeypatch.setattr(main, "read_router", router)
+    monkeypatch.setattr(main, "EXPORT_DIR", str(tmp_path))
+
+    response = client.post(
+        "/analytics/heartbeat",
+        json={"id": str(uuid4()), "mode": "demo", "version": "test", "ts": 1735732800000},
+    )
+    assert response.status_code == 204
+    assert client.post("/admin/export", headers=admin_headers).status_code == 200
+    assert "X-Read-Pin" not in response.headers
+    assert router._pinned == {}
+
+
+def test_pin_secret_is_read_on_first_use(monkeypatch, clock):
+    monkeypatch.delenv("API_KEY", raising=False)
+    worker_a = ReplicaRouter(_sqlite_engine("primary"), [_sqlite_engine("replica_a")], clock=clock)
+    worker_b = ReplicaRouter(worker_a.primary, worker_a.replicas, clock=clock)
+    # Settings from backend/.env only land in the environment after import.
+    monkeypatch.setenv("READ_PIN_SECRET", "shared")
+
+    token = worker_a.record_write("writer")
+    assert worker_b.is_pinned("writer", token)
+
+
+def test_missing_pin_secret_warns(monkeypatch, clock):
+    monkeypatch.delenv("API_KEY", raising=False)
+    monkeypatch.delenv("READ_PIN_SECRET", raising=False)
+    router = ReplicaRouter(_sqlite_engine("primary"), [_sqlite_engine("replica_a")], clock=clock)
+    with pytest.warns(RuntimeWarning, match="READ_PIN_SECRET"):
+        token = router.record_write("writer")
+    assert router.is_pinned("writer", token)
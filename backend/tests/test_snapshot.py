@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy.orm import Session
+
+import main
+import models
+import snapshot
+from database import ensure_columns, make_engine
+
+from .factories import job_payload
+
+
+def _ms(value: str) -> int:
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _heartbeat(client, install_id, when):
+    response = client.post(
+        "/analytics/heartbeat",
+        json={"id": install_id, "mode": "local", "version": "test", "ts": _ms(when)},
+    )
+    assert response.status_code == 204
+
+
+@pytest.fixture(autouse=True)
+def _no_commit_lag(monkeypatch):
+    monkeypatch.setattr(snapshot, "COMMIT_LAG", timedelta(0))
+
+
+@pytest.fixture()
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _read(path, fmt="parquet"):
+    return ds.dataset(str(path), format=fmt, partitioning="hive").to_table()
+
+
+def test_export_is_partitioned_by_day_and_incremental(client, admin_headers, export_dir):
+    install_id = str(uuid4())
+    _heartbeat(client, install_id, "2025-01-01T10:00:00")
+    _heartbeat(client, install_id, "2025-01-02T10:00:00")
+
+    response = client.post("/admin/export", headers=admin_headers)
+    assert response.status_code == 200
+    events, installs = response.json()
+    assert events["table"] == "analytics_events" and events["rows"] == 2
+    assert installs["rows"] == 1
+    assert sorted(p.name for p in (export_dir / "analytics_events").iterdir()) == [
+        "date=2025-01-01",
+        "date=2025-01-02",
+    ]
+    table = _read(export_dir / "analytics_events")
+    assert sorted(table.column("event").to_pylist()) == ["launch_local", "launch_local"]
+
+    repeat = client.post("/admin/export", headers=admin_headers).json()
+    assert [summary["rows"] for summary in repeat] == [0, 0]
+
+    _heartbeat(client, install_id, "2025-01-02T12:00:00")
+    latest = client.post("/admin/export", headers=admin_headers).json()
+    assert [summary["rows"] for summary in latest] == [1, 1]
+    assert len(list((export_dir / "analytics_events" / "date=2025-01-02").iterdir())) == 2
+    assert _read(export_dir / "analytics_events").num_rows == 3
+
+    watermarks = json.loads((export_dir / snapshot.WATERMARK_FILE).read_text())
+    assert watermarks["analytics_installs"]["id"] == install_id
+    assert set(watermarks["analytics_events"]) == {"recorded_at", "id"}
+
+
+def test_late_heartbeat_does_not_move_last_seen_back(client, db_session):
+    install_id = str(uuid4())
+    _heartbeat(client, install_id, "2025-01-02T10:00:00")
+    _heartbeat(client, install_id, "2025-01-01T10:00:00")
+    db_session.expire_all()
+    install = db_session.get(models.AnalyticsInstall, install_id)
+    assert (install.last_seen, install.launch_count) == (datetime(2025, 1, 2, 10), 2)
+
+
+def test_client_clocks_behind_the_watermark_are_still_exported(client, admin_headers, export_dir):
+    _heartbeat(client, str(uuid4()), "2025-01-05T10:00:00")
+    client.post("/admin/export", headers=admin_headers)
+
+    # A new install whose clock is behind the first one's.
+    late_install = str(uuid4())
+    _heartbeat(client, late_install, "2025-01-04T10:00:00")
+    events, installs = client.post("/admin/export", headers=admin_headers).json()
+    assert (events["rows"], installs["rows"]) == (1, 1)
+    assert late_install in _read(export_dir / "analytics_installs").column("id").to_pylist()
+
+
+def test_rows_younger_than_commit_lag_wait_for_the_next_run(client, admin_headers, export_dir, monkeypatch):
+    _heartbeat(client, str(uuid4()), "2025-01-05T10:00:00")
+    monkeypatch.setattr(snapshot, "COMMIT_LAG", timedelta(minutes=1))
+    assert [s["rows"] for s in client.post("/admin/export", headers=admin_headers).json()] == [0, 0]
+
+    monkeypatch.setattr(snapshot, "COMMIT_LAG", timedelta(0))
+    assert [s["rows"] for s in client.post("/admin/export", headers=admin_headers).json()] == [1, 1]
+
+
+def test_legacy_schema_and_watermarks_are_migrated(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE analytics_events (id INTEGER PRIMARY KEY, install_id VARCHAR, event VARCHAR, ts DATETIME)"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE analytics_installs (id VARCHAR PRIMARY KEY, first_seen DATETIME, last_seen DATETIME, "
+            "launch_count INTEGER, mode VARCHAR, version VARCHAR)"
+        )
+        for i in (1, 2, 3):
+            connection.exec_driver_sql(
+                f"INSERT INTO analytics_events VALUES ({i}, 'a', 'launch_local', '2025-01-0{i} 10:00:00.000000')"
+            )
+    ensure_columns(engine)
+    ensure_columns(engine)
+
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    (out_dir / snapshot.WATERMARK_FILE).write_text(json.dumps({"analytics_events": [2]}))
+    with Session(engine) as db:
+        db.add(models.AnalyticsEvent(install_id="a", event="launch_local", ts=datetime(2025, 1, 4, 10)))
+        db.commit()
+        [events] = snapshot.export_snapshot(db, str(out_dir), ["analytics_events"])
+    assert events["rows"] == 2
+    assert sorted(_read(out_dir / "analytics_events").column("id").to_pylist()) == [3, 4]
+
+
+def test_interleaved_days_get_one_file_and_row_group_each(client, db_session, tmp_path):
+    install_id = str(uuid4())
+    for when in ["2025-01-02T09:00:00", "2025-01-01T09:00:00", "2025-01-02T10:00:00", "2025-01-01T10:00:00"]:
+        _heartbeat(client, install_id, when)
+
+    events, _ = snapshot.export_snapshot(db_session, str(tmp_path), batch_size=3)
+    assert events["rows"] == 4
+    assert len(events["files"]) == 2
+    for path in events["files"]:
+        metadata = pq.ParquetFile(path).metadata
+        assert (metadata.num_row_groups, metadata.num_rows) == (1, 2)
+
+    watermarks = json.loads((tmp_path / snapshot.WATERMARK_FILE).read_text())
+    assert watermarks["analytics_events"]["id"] == max(_read(tmp_path / "analytics_events").column("id").to_pylist())
+
+
+def test_arrow_jobs_snapshot_in_small_batches(client, admin_headers, db_session, tmp_path):
+    for _ in range(5):
+        client.post("/jobs/", headers=admin_headers, json=job_payload())
+
+    for _ in range(2):
+        [summary] = snapshot.export_snapshot(db_session, str(tmp_path), ["jobs"], fmt="arrow", batch_size=2)
+    assert summary["rows"] == 5
+
+    part_dir = tmp_path / "jobs" / f"date={datetime.utcnow().date().isoformat()}"
+    [path] = part_dir.iterdir()
+    with ipc.open_file(str(path)) as reader:
+        assert reader.num_record_batches == 3
+        table = reader.read_all()
+    assert table.num_rows == 5
+    assert json.loads(table.column("status_history")[0].as_py())[0]["status"] == "Applied"
+
+
+def test_export_waits_for_lock_held_by_another_worker(db_session, tmp_path):
+    with open(tmp_path / snapshot.LOCK_FILE, "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        run = threading.Thread(target=snapshot.export_snapshot, args=(db_session, str(tmp_path), ["jobs"]))
+        run.start()
+        run.join(0.2)
+        assert run.is_alive()
+        assert not (tmp_path / snapshot.WATERMARK_FILE).exists()
+        fcntl.flock(handle, fcntl.LOCK_UN)
+    run.join(5)
+    assert not run.is_alive()
+    assert (tmp_path / snapshot.WATERMARK_FILE).exists()
+
+
+def test_export_rejects_unknown_tables(client, admin_headers, export_dir):
+    response = client.post("/admin/export?tables=jobs,secrets", headers=admin_headers)
+    assert response.status_code == 400
+    assert client.post("/admin/export").status_code == 401
+
+
+def test_cli_writes_watermarks(tmp_path, capsys):
+    snapshot.main(["--out", str(tmp_path), "--format", "arrow", "--tables", "analytics_events"])
+    assert "analytics_events: 0 rows, 0 files" in capsys.readouterr().out
+    assert json.loads((tmp_path / snapshot.WATERMARK_FILE).read_text()) == {}
@@ -11,6 +11,25 @@ const applyAdminHeaders = (client, apiKey) => {
   client.defaults.headers.common.Authorization = `Bearer ${apiKey}`;
 };
 
+// Writes return a short-lived `X-Read-Pin` token; sending it back keeps the
+// next reads on the primary database so they include the write.
+const echoReadPin = (client) => {
+  let readPin = null;
+  client.interceptors.request.use((config) => {
+    if (readPin) {
+      config.headers['X-Read-Pin'] = readPin;
+    }
+    return config;
+  });
+  client.interceptors.response.use((response) => {
+    const pin = response.headers?.['x-read-pin'];
+    if (pin) {
+      readPin = pin;
+    }
+    return response;
+  });
+};
+
 export const createApiDriver = ({ apiKey }) => {
   const baseUrl = import.meta.env.VITE_API_BASE_URL;
   if (!baseUrl) {
@@ -24,6 +43,7 @@ export const createApiDriver = ({ apiKey }) => {
   });
 
   applyAdminHeaders(client, apiKey);
+  echoReadPin(client);
 
   const fetchJobs = async () => {
     const response = await client.get('/jobs/');